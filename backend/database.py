@@ -2,9 +2,12 @@
 Database models and connection setup for EEG Rater.
 """
 import os
+import queue
+import threading
+import time
 from datetime import datetime
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Index, insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -38,6 +41,9 @@ class Rating(Base):
     rating = Column(Integer, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    # Covers the per-rater snippet_id lookups in progress/unrated queries
+    __table_args__ = (Index("ix_ratings_rater_snippet_id", "rater", "snippet_id"),)
+
 
 class Comparison(Base):
     __tablename__ = "comparisons"
@@ -51,8 +57,11 @@ class Comparison(Base):
 
 
 def init_db():
-    """Create all tables."""
+    """Create all tables, and any indexes added after a table was created."""
     Base.metadata.create_all(bind=engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 
 def get_db():
@@ -62,3 +71,78 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+class WriteBehindQueue:
+    """
+    Buffers rows and inserts them from a background thread, one executemany
+    per table every flush_interval seconds or max_batch rows, whichever
+    comes first. Rows still queued when the process dies are lost.
+    """
+
+    def __init__(self, flush_interval: float = 0.1, max_batch: int = 500):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def put(self, model, row: dict):
+        """Queue a row (column name -> value) for insertion into model's table."""
+        self._queue.put((model, row))
+
+    def start(self):
+        """Start the writer thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the writer thread after flushing everything queued so far."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list):
+        rows_by_model = {}
+        for model, row in batch:
+            rows_by_model.setdefault(model, []).append(row)
+
+        db = SessionLocal()
+        try:
+            for model, rows in rows_by_model.items():
+                db.execute(insert(model), rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error writing {len(batch)} queued rows: {e}")
+        finally:
+            db.close()
+
+
+write_queue = WriteBehindQueue()
@@ -7,6 +7,8 @@ import json
 import hashlib
 import struct
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from typing import Optional
 
@@ -16,7 +18,7 @@ def read_edf(filepath):
     Read an EDF file and return the data and metadata.
 
     Returns:
-        dict with keys: channel_names, data (in microvolts), sampling_rate, duration
+        dict with keys: channel_names, data (float32, in microvolts), sampling_rate, duration
     """
     with open(filepath, 'rb') as f:
         # === READ HEADER ===
@@ -51,81 +53,65 @@ def read_edf(filepath):
         n_channels = int(f.read(4).decode('ascii').strip())
 
         # === READ CHANNEL HEADERS ===
-        # Labels (16 bytes each)
-        channel_names = []
-        for _ in range(n_channels):
-            channel_names.append(f.read(16).decode('ascii').strip())
-
-        # Transducer type (80 bytes each) - skip
-        for _ in range(n_channels):
-            f.read(80)
-
-        # Physical dimension (8 bytes each) - skip
-        for _ in range(n_channels):
-            f.read(8)
-
-        # Physical minimum (8 bytes each)
-        physical_min = []
-        for _ in range(n_channels):
-            physical_min.append(float(f.read(8).decode('ascii').strip()))
-
-        # Physical maximum (8 bytes each)
-        physical_max = []
-        for _ in range(n_channels):
-            physical_max.append(float(f.read(8).decode('ascii').strip()))
-
-        # Digital minimum (8 bytes each)
-        digital_min = []
-        for _ in range(n_channels):
-            digital_min.append(int(f.read(8).decode('ascii').strip()))
-
-        # Digital maximum (8 bytes each)
-        digital_max = []
-        for _ in range(n_channels):
-            digital_max.append(int(f.read(8).decode('ascii').strip()))
+        # Every field is stored for all channels before the next field
+        # starts, so read the whole block once and parse each field as a
+        # fixed-width byte-string array
+        channel_header = f.read(256 * n_channels)
 
-        # Prefiltering (80 bytes each) - skip
-        for _ in range(n_channels):
-            f.read(80)
+        def header_field(offset, width):
+            # offset is the field's position within a 256-byte channel header
+            return np.frombuffer(channel_header, dtype=f'S{width}',
+                                 count=n_channels, offset=offset * n_channels)
 
-        # Number of samples per data record (8 bytes each)
-        samples_per_record = []
-        for _ in range(n_channels):
-            samples_per_record.append(int(f.read(8).decode('ascii').strip()))
+        # Labels (16 bytes each)
+        channel_names = [label.decode('ascii').strip() for label in header_field(0, 16)]
 
-        # Reserved (32 bytes each) - skip
-        for _ in range(n_channels):
-            f.read(32)
+        # Transducer type (80 bytes each) and physical dimension (8 bytes each) - skip
 
-        # === READ DATA ===
-        # Seek to data start (should already be there, but make sure)
-        f.seek(header_size)
+        # Physical minimum/maximum (8 bytes each)
+        physical_min = header_field(104, 8).astype(np.float64)
+        physical_max = header_field(112, 8).astype(np.float64)
 
-        # Calculate total samples per channel
-        total_samples = n_records * samples_per_record[0]  # Assuming all channels same
+        # Digital minimum/maximum (8 bytes each)
+        digital_min = header_field(120, 8).astype(np.int64)
+        digital_max = header_field(128, 8).astype(np.int64)
 
-        # Initialize data array
-        data = np.zeros((n_channels, total_samples))
+        # Prefiltering (80 bytes each) - skip
 
-        # Read data records
-        for rec in range(n_records):
-            for ch in range(n_channels):
-                n_samples = samples_per_record[ch]
-                # Read as 16-bit signed integers
-                raw_data = f.read(n_samples * 2)
-                digital_values = np.frombuffer(raw_data, dtype=np.int16)
+        # Number of samples per data record (8 bytes each)
+        samples_per_record = header_field(216, 8).astype(np.int64)
 
-                # Convert to physical values (microvolts)
-                # Must convert to float first to avoid int16 overflow!
-                scale = (physical_max[ch] - physical_min[ch]) / (digital_max[ch] - digital_min[ch])
-                physical_values = (digital_values.astype(np.float64) - digital_min[ch]) * scale + physical_min[ch]
+        # Reserved (32 bytes each) - skip
 
-                # Store in data array
-                start_idx = rec * n_samples
-                data[ch, start_idx:start_idx + n_samples] = physical_values
+        # === READ DATA ===
+        # Each data record holds samples_per_record[ch] int16 samples for
+        # every channel in turn
+        n_samples = int(samples_per_record[0])  # Assuming all channels same
+        if np.any(samples_per_record != n_samples):
+            raise ValueError("Channels with differing sample rates are not supported")
+
+        # Map the data section instead of reading it; the OS pages it in
+        # as the conversion below walks over it
+        raw = np.memmap(filepath, dtype='<i2', mode='r', offset=header_size,
+                        shape=(n_records, n_channels, n_samples))
+
+        # Convert to physical values (microvolts) for all channels at once.
+        # float32 comfortably covers the 16-bit EDF range at half the memory
+        scale = (physical_max - physical_min) / (digital_max - digital_min)
+        offset = physical_min - digital_min * scale
+        scale = scale.astype(np.float32)[:, None, None]
+        offset = offset.astype(np.float32)[:, None, None]
+
+        # De-interleave records into one contiguous row per channel while
+        # scaling, without an intermediate int16 or float copy
+        data = np.empty((n_channels, n_records, n_samples), dtype=np.float32)
+        np.multiply(raw.transpose(1, 0, 2), scale, out=data)
+        data += offset
+        data = data.reshape(n_channels, n_records * n_samples)
+        del raw
 
         # Calculate sampling rate (samples per second)
-        sampling_rate = samples_per_record[0] / record_duration
+        sampling_rate = n_samples / record_duration
 
         # Total duration
         duration = n_records * record_duration
@@ -146,15 +132,37 @@ class EDFParser:
         self.cache_directory = Path(cache_directory)
         self.cache_directory.mkdir(parents=True, exist_ok=True)
         self.snippet_duration = 10  # seconds
-        self._snippets_cache: Optional[list] = None
+        self._meta_cache: Optional[list] = None
+        self._meta_by_id: dict = {}
+        self._snippet_ids: tuple = ()
+        # snippet id -> (path of the file's .npy cache, row within it)
+        self._data_location_by_id: dict = {}
+        # .npy cache path -> memory-mapped array, opened on first access
+        self._data_arrays: dict = {}
+        self._cache_path_by_file: dict = {}
 
     def _get_cache_path(self, edf_file: Path) -> Path:
-        """Generate cache file path for an EDF file."""
-        file_hash = hashlib.md5(str(edf_file).encode()).hexdigest()[:8]
-        return self.cache_directory / f"{edf_file.stem}_{file_hash}_snippets.json"
-
-    def _extract_snippets_from_edf(self, edf_path: Path) -> list:
-        """Extract 10-second snippets from an EDF file."""
+        """
+        Generate cache file path for an EDF file.
+
+        The returned JSON file holds snippet metadata; the sample arrays live
+        next to it in an .npy file with the same stem, one row per snippet.
+        """
+        cache_path = self._cache_path_by_file.get(edf_file)
+        if cache_path is None:
+            file_hash = hashlib.blake2b(str(edf_file).encode(), digest_size=4).hexdigest()
+            cache_path = self.cache_directory / f"{edf_file.stem}_{file_hash}_snippets.json"
+            self._cache_path_by_file[edf_file] = cache_path
+        return cache_path
+
+    def _extract_snippets_from_edf(self, edf_path: Path) -> tuple:
+        """
+        Extract 10-second snippets from an EDF file.
+
+        Returns:
+            (metadata list, array of shape (n_snippets, n_channels, n_samples)),
+            or ([], None) if the file could not be read
+        """
         snippets = []
 
         try:
@@ -168,26 +176,25 @@ class EDFParser:
 
             # Calculate number of complete 10-second snippets
             n_snippets = int(duration // self.snippet_duration)
+            if n_snippets == 0:
+                return [], None
+
+            # Snippets are back-to-back windows, so a reshape gives every
+            # one of them as a view without slicing in a loop
+            snippet_samples = int(self.snippet_duration * sfreq)
+            windows = data[:, :n_snippets * snippet_samples]
+            windows = windows.reshape(len(channel_names), n_snippets, snippet_samples)
+            windows = windows.transpose(1, 0, 2)
 
             for i in range(n_snippets):
                 start_time = i * self.snippet_duration
                 end_time = start_time + self.snippet_duration
 
-                # Extract data for this time window
-                start_sample = int(start_time * sfreq)
-                end_sample = int(end_time * sfreq)
-
-                snippet_data = data[:, start_sample:end_sample]
-
-                # Convert to list for JSON serialization
-                data_list = snippet_data.tolist()
-
                 snippet_id = f"{edf_path.stem}_snippet_{i:04d}"
 
                 snippets.append({
                     "id": snippet_id,
                     "channels": channel_names,
-                    "data": data_list,
                     "sampling_rate": sfreq,
                     "duration": self.snippet_duration,
                     "source_file": edf_path.name,
@@ -195,62 +202,125 @@ class EDFParser:
                     "end_time": end_time
                 })
 
-            return snippets
+            return snippets, windows
 
         except Exception as e:
             print(f"Error processing {edf_path}: {e}")
-            return []
+            return [], None
 
-    def process_edf_file(self, edf_path: Path, force_reprocess: bool = False) -> list:
-        """Process an EDF file and cache the snippets."""
+    def _load_cached_snippets(self, edf_path: Path) -> Optional[list]:
+        """Load cached snippet metadata for an EDF file, or None if it needs processing."""
         cache_path = self._get_cache_path(edf_path)
+        data_path = cache_path.with_suffix('.npy')
+
+        if not (cache_path.exists() and data_path.exists()):
+            return None
+
+        try:
+            with open(cache_path, 'r') as f:
+                snippets = json.load(f)
+            # Only the .npy header is read here
+            if np.load(data_path, mmap_mode='r').shape[0] == len(snippets):
+                return snippets
+            raise ValueError("snippet count mismatch")
+        except (json.JSONDecodeError, ValueError, OSError):
+            # Cache files are corrupted, delete and reprocess
+            print(f"Corrupted cache file detected: {cache_path}, regenerating...")
+            cache_path.unlink(missing_ok=True)
+            data_path.unlink(missing_ok=True)
+            return None
+
+    def process_edf_file(self, edf_path: Path, force_reprocess: bool = False) -> list:
+        """
+        Process an EDF file and cache the snippets.
+
+        Returns the snippet metadata only; sample data is left on disk for
+        get_snippet_by_id to map in when needed.
+        """
+        if not force_reprocess:
+            snippets = self._load_cached_snippets(edf_path)
+            if snippets is not None:
+                return snippets
 
-        # Check if cached version exists
-        if cache_path.exists() and not force_reprocess:
-            try:
-                with open(cache_path, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                # Cache file is corrupted, delete and reprocess
-                print(f"Corrupted cache file detected: {cache_path}, regenerating...")
-                cache_path.unlink()
+        cache_path = self._get_cache_path(edf_path)
+        data_path = cache_path.with_suffix('.npy')
 
         # Extract snippets
-        snippets = self._extract_snippets_from_edf(edf_path)
+        snippets, snippet_data = self._extract_snippets_from_edf(edf_path)
 
-        # Cache the results
+        # Cache the results: sample arrays as binary, metadata as JSON
         if snippets:
+            np.save(data_path, snippet_data)
             with open(cache_path, 'w') as f:
                 json.dump(snippets, f)
 
         return snippets
 
-    def get_all_snippets(self, force_reprocess: bool = False) -> list:
-        """Get all snippets from all EDF files in the directory."""
-        if self._snippets_cache is not None and not force_reprocess:
-            return self._snippets_cache
+    def get_all_metadata(self, force_reprocess: bool = False) -> list:
+        """Get metadata (everything but sample data) for all snippets in the directory."""
+        if self._meta_cache is not None and not force_reprocess:
+            return self._meta_cache
 
-        all_snippets = []
+        # Drop open mappings so their cache files can be rewritten
+        self._data_arrays = {}
 
         # Find all EDF files (case-insensitive, avoid duplicates on Windows)
         edf_files = list(set(self.edf_directory.glob("*.edf")) | set(self.edf_directory.glob("*.EDF")))
 
+        # Serve what we can from the cache, then parse the rest; files are
+        # independent, so parse them in parallel when there is more than one
+        snippets_by_file = {}
+        pending = []
         for edf_file in edf_files:
-            snippets = self.process_edf_file(edf_file, force_reprocess)
+            snippets = None if force_reprocess else self._load_cached_snippets(edf_file)
+            if snippets is None:
+                pending.append(edf_file)
+            else:
+                snippets_by_file[edf_file] = snippets
+
+        if len(pending) > 1:
+            max_workers = min(len(pending), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                processed = list(executor.map(self.process_edf_file, pending, repeat(True)))
+        else:
+            processed = [self.process_edf_file(edf_file, True) for edf_file in pending]
+        snippets_by_file.update(zip(pending, processed))
+
+        all_snippets = []
+        data_location_by_id = {}
+
+        for edf_file in edf_files:
+            snippets = snippets_by_file[edf_file]
+            data_path = self._get_cache_path(edf_file).with_suffix('.npy')
+            for index, snippet in enumerate(snippets):
+                data_location_by_id[snippet["id"]] = (data_path, index)
             all_snippets.extend(snippets)
 
-        self._snippets_cache = all_snippets
+        self._meta_cache = all_snippets
+        self._meta_by_id = {s["id"]: s for s in all_snippets}
+        self._snippet_ids = tuple(self._meta_by_id)
+        self._data_location_by_id = data_location_by_id
         return all_snippets
 
+    def _load_snippet_data(self, snippet_id: str) -> np.ndarray:
+        """Return the (n_channels, n_samples) data for a snippet as a memory-mapped view."""
+        data_path, index = self._data_location_by_id[snippet_id]
+        arrays = self._data_arrays.get(data_path)
+        if arrays is None:
+            arrays = np.load(data_path, mmap_mode='r')
+            self._data_arrays[data_path] = arrays
+        # Plain ndarray view (not np.memmap) so serializers accept it
+        return np.asarray(arrays[index])
+
     def get_snippet_by_id(self, snippet_id: str) -> Optional[dict]:
-        """Get a specific snippet by ID."""
-        snippets = self.get_all_snippets()
-        for snippet in snippets:
-            if snippet["id"] == snippet_id:
-                return snippet
-        return None
-
-    def get_snippet_ids(self) -> list:
-        """Get list of all snippet IDs."""
-        snippets = self.get_all_snippets()
-        return [s["id"] for s in snippets]
+        """Get a specific snippet by ID, including its sample data."""
+        self.get_all_metadata()
+        meta = self._meta_by_id.get(snippet_id)
+        if meta is None:
+            return None
+        return {**meta, "data": self._load_snippet_data(snippet_id)}
+
+    def get_snippet_ids(self) -> tuple:
+        """Get all snippet IDs."""
+        self.get_all_metadata()
+        return self._snippet_ids
@@ -1,19 +1,22 @@
 """
 FastAPI backend for EEG Rater application.
 """
+import json
 import os
 import random
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from backend.edf_parser import EDFParser
-from backend.database import init_db, get_db, Rating, Comparison
+from backend.database import init_db, get_db, write_queue, Rating, Comparison
 
 # Configuration
 BASE_DIR = Path(__file__).parent.parent
@@ -30,7 +33,7 @@ CACHE_DIR.mkdir(exist_ok=True)
 edf_parser = EDFParser(str(EDF_DIR), str(CACHE_DIR))
 
 # FastAPI app
-app = FastAPI(title="EEG Rater API", version="1.0.0")
+app = FastAPI(title="EEG Rater API", version="1.0.0", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -38,13 +41,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Channels", "X-Sampling-Rate"],
 )
 
 
-# Initialize database on startup
+# Initialize database and warm the snippet cache on startup
 @app.on_event("startup")
 def startup_event():
     init_db()
+    write_queue.start()
+    # Parse/load all snippets now so the first request doesn't pay for it
+    edf_parser.get_all_metadata()
+
+
+# Flush queued ratings/comparisons on shutdown
+@app.on_event("shutdown")
+def shutdown_event():
+    write_queue.stop()
 
 
 # Pydantic models
@@ -78,7 +91,7 @@ def health_check():
 @app.get("/api/snippets")
 def list_snippets():
     """List all available snippets (metadata only, not full data)."""
-    snippets = edf_parser.get_all_snippets()
+    snippets = edf_parser.get_all_metadata()
     summaries = [
         {
             "id": s["id"],
@@ -98,7 +111,27 @@ def get_snippet(snippet_id: str):
     snippet = edf_parser.get_snippet_by_id(snippet_id)
     if snippet is None:
         raise HTTPException(status_code=404, detail="Snippet not found")
-    return snippet
+    # orjson serializes the numpy sample array directly, no tolist() needed
+    return ORJSONResponse(snippet)
+
+
+@app.get("/api/snippets/{snippet_id}/data.bin")
+def get_snippet_data(snippet_id: str):
+    """
+    Get a snippet's samples as raw little-endian float32, one channel after
+    another. Channel names and sampling rate are sent as response headers.
+    """
+    snippet = edf_parser.get_snippet_by_id(snippet_id)
+    if snippet is None:
+        raise HTTPException(status_code=404, detail="Snippet not found")
+    return Response(
+        content=snippet["data"].astype('<f4', copy=False).tobytes(),
+        media_type="application/octet-stream",
+        headers={
+            "X-Channels": json.dumps(snippet["channels"]),
+            "X-Sampling-Rate": str(snippet["sampling_rate"])
+        }
+    )
 
 
 @app.get("/api/snippets-random-pair")
@@ -117,12 +150,12 @@ def get_random_pair():
     snippet_a = edf_parser.get_snippet_by_id(pair[0])
     snippet_b = edf_parser.get_snippet_by_id(pair[1])
 
-    return {"snippet_a": snippet_a, "snippet_b": snippet_b}
+    return ORJSONResponse({"snippet_a": snippet_a, "snippet_b": snippet_b})
 
 
-@app.post("/api/ratings")
-def submit_rating(submission: RatingSubmission, db: Session = Depends(get_db)):
-    """Submit a rating for a snippet."""
+@app.post("/api/ratings", status_code=202)
+def submit_rating(submission: RatingSubmission):
+    """Submit a rating for a snippet. It is written to the database in the background."""
     # Validate rating range
     if not 1 <= submission.rating <= 10:
         raise HTTPException(status_code=400, detail="Rating must be between 1 and 10")
@@ -131,30 +164,24 @@ def submit_rating(submission: RatingSubmission, db: Session = Depends(get_db)):
     if edf_parser.get_snippet_by_id(submission.snippet_id) is None:
         raise HTTPException(status_code=404, detail="Snippet not found")
 
-    # Create rating record
-    rating = Rating(
-        snippet_id=submission.snippet_id,
-        rater=submission.rater,
-        rating=submission.rating
-    )
-    db.add(rating)
-    db.commit()
-    db.refresh(rating)
+    # Queue rating record
+    rating = {
+        "snippet_id": submission.snippet_id,
+        "rater": submission.rater,
+        "rating": submission.rating,
+        "timestamp": datetime.utcnow()
+    }
+    write_queue.put(Rating, rating)
 
     return {
-        "status": "success",
-        "rating": {
-            "snippet_id": rating.snippet_id,
-            "rater": rating.rater,
-            "rating": rating.rating,
-            "timestamp": rating.timestamp.isoformat()
-        }
+        "status": "accepted",
+        "rating": {**rating, "timestamp": rating["timestamp"].isoformat()}
     }
 
 
-@app.post("/api/comparisons")
-def submit_comparison(submission: ComparisonSubmission, db: Session = Depends(get_db)):
-    """Submit a comparison result."""
+@app.post("/api/comparisons", status_code=202)
+def submit_comparison(submission: ComparisonSubmission):
+    """Submit a comparison result. It is written to the database in the background."""
     # Validate winner
     valid_winners = [submission.snippet_a, submission.snippet_b, "tie"]
     if submission.winner not in valid_winners:
@@ -166,26 +193,19 @@ def submit_comparison(submission: ComparisonSubmission, db: Session = Depends(ge
     if edf_parser.get_snippet_by_id(submission.snippet_b) is None:
         raise HTTPException(status_code=404, detail="Snippet B not found")
 
-    # Create comparison record
-    comparison = Comparison(
-        snippet_a=submission.snippet_a,
-        snippet_b=submission.snippet_b,
-        winner=submission.winner,
-        rater=submission.rater
-    )
-    db.add(comparison)
-    db.commit()
-    db.refresh(comparison)
+    # Queue comparison record
+    comparison = {
+        "snippet_a": submission.snippet_a,
+        "snippet_b": submission.snippet_b,
+        "winner": submission.winner,
+        "rater": submission.rater,
+        "timestamp": datetime.utcnow()
+    }
+    write_queue.put(Comparison, comparison)
 
     return {
-        "status": "success",
-        "comparison": {
-            "snippet_a": comparison.snippet_a,
-            "snippet_b": comparison.snippet_b,
-            "winner": comparison.winner,
-            "rater": comparison.rater,
-            "timestamp": comparison.timestamp.isoformat()
-        }
+        "status": "accepted",
+        "comparison": {**comparison, "timestamp": comparison["timestamp"].isoformat()}
     }
 
 
@@ -195,12 +215,15 @@ def get_progress(rater: str, db: Session = Depends(get_db)):
     all_snippets = edf_parser.get_snippet_ids()
     total_snippets = len(all_snippets)
 
-    # Get ratings for this rater
-    ratings = db.query(Rating).filter(Rating.rater == rater).all()
-    rated_snippet_ids = set(r.snippet_id for r in ratings)
+    # Get rated snippet IDs for this rater (column-only, served by the index)
+    rated_snippet_ids = {
+        sid for (sid,) in db.query(Rating.snippet_id).filter(Rating.rater == rater).distinct()
+    }
 
     # Get comparisons for this rater
-    comparison_count = db.query(Comparison).filter(Comparison.rater == rater).count()
+    comparison_count = (
+        db.query(func.count(Comparison.id)).filter(Comparison.rater == rater).scalar()
+    )
 
     return {
         "rater": rater,
@@ -214,52 +237,34 @@ def get_progress(rater: str, db: Session = Depends(get_db)):
 @app.get("/api/unrated-snippets/{rater}")
 def get_unrated_snippets(rater: str, db: Session = Depends(get_db)):
     """Get list of snippet IDs not yet rated by this rater."""
-    all_snippet_ids = set(edf_parser.get_snippet_ids())
-
-    ratings = db.query(Rating).filter(Rating.rater == rater).all()
-    rated_ids = set(r.snippet_id for r in ratings)
+    rated_ids = {
+        sid for (sid,) in db.query(Rating.snippet_id).filter(Rating.rater == rater).distinct()
+    }
 
-    unrated_ids = list(all_snippet_ids - rated_ids)
+    # Snippets live on disk rather than in the database, so filter the
+    # parser's cached id tuple against the (small) set of rated ids
+    unrated_ids = [sid for sid in edf_parser.get_snippet_ids() if sid not in rated_ids]
     return {"unrated_snippet_ids": unrated_ids, "count": len(unrated_ids)}
 
 
 @app.get("/api/ratings")
 def get_all_ratings(db: Session = Depends(get_db)):
     """Get all ratings (for analysis)."""
-    ratings = db.query(Rating).all()
-    return {
-        "ratings": [
-            {
-                "id": r.id,
-                "snippet_id": r.snippet_id,
-                "rater": r.rater,
-                "rating": r.rating,
-                "timestamp": r.timestamp.isoformat()
-            }
-            for r in ratings
-        ],
-        "total": len(ratings)
-    }
+    # Plain column rows instead of ORM objects; orjson encodes the datetimes
+    rows = db.execute(
+        select(Rating.id, Rating.snippet_id, Rating.rater, Rating.rating, Rating.timestamp)
+    ).mappings().all()
+    return ORJSONResponse({"ratings": [dict(r) for r in rows], "total": len(rows)})
 
 
 @app.get("/api/comparisons")
 def get_all_comparisons(db: Session = Depends(get_db)):
     """Get all comparisons (for analysis)."""
-    comparisons = db.query(Comparison).all()
-    return {
-        "comparisons": [
-            {
-                "id": c.id,
-                "snippet_a": c.snippet_a,
-                "snippet_b": c.snippet_b,
-                "winner": c.winner,
-                "rater": c.rater,
-                "timestamp": c.timestamp.isoformat()
-            }
-            for c in comparisons
-        ],
-        "total": len(comparisons)
-    }
+    rows = db.execute(
+        select(Comparison.id, Comparison.snippet_a, Comparison.snippet_b,
+               Comparison.winner, Comparison.rater, Comparison.timestamp)
+    ).mappings().all()
+    return ORJSONResponse({"comparisons": [dict(r) for r in rows], "total": len(rows)})
 
 
 if __name__ == "__main__":
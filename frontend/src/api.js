@@ -6,3 +6,21 @@ const api = axios.create({
 })
 
 export default api
+
+// Fetch a snippet as raw float32 samples instead of JSON; channel names and
+// sampling rate come back in response headers
+export async function fetchSnippet(snippetId) {
+  const res = await api.get(`/api/snippets/${snippetId}/data.bin`, {
+    responseType: 'arraybuffer'
+  })
+  const channels = JSON.parse(res.headers['x-channels'])
+  const samples = new Float32Array(res.data)
+  const numSamples = samples.length / channels.length
+
+  return {
+    id: snippetId,
+    channels,
+    sampling_rate: parseFloat(res.headers['x-sampling-rate']),
+    data: channels.map((_, idx) => samples.subarray(idx * numSamples, (idx + 1) * numSamples))
+  }
+}
@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react'
-import api from '../api'
+import api, { fetchSnippet } from '../api'
 import EEGViewer from './EEGViewer'
 
 function RatingMode({ rater }) {
@@ -54,8 +54,7 @@ function RatingMode({ rater }) {
 
       const snippetId = snippets[currentIndex].id
       try {
-        const res = await api.get(`/api/snippets/${snippetId}`)
-        setCurrentSnippet(res.data)
+        setCurrentSnippet(await fetchSnippet(snippetId))
         // Reset rating selection if this snippet was already rated
         if (ratedSnippets.has(snippetId)) {
           setSelectedRating(null) // Could load previous rating here
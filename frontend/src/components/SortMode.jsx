@@ -1,5 +1,5 @@
 import { useState, useEffect, useCallback } from 'react'
-import api from '../api'
+import api, { fetchSnippet } from '../api'
 import EEGViewer from './EEGViewer'
 
 // Merge sort implementation that yields pairs for comparison
@@ -126,7 +126,7 @@ function SortMode({ rater }) {
 
         // Load full data for selected snippets
         const fullSnippets = await Promise.all(
-          selected.map(s => api.get(`/api/snippets/${s.id}`).then(r => r.data))
+          selected.map(s => fetchSnippet(s.id))
         )
 
         setSelectedSnippets(fullSnippets)
@@ -227,7 +227,7 @@ function SortMode({ rater }) {
 
     // Load full data for new selection
     Promise.all(
-      selected.map(s => api.get(`/api/snippets/${s.id}`).then(r => r.data))
+      selected.map(s => fetchSnippet(s.id))
     ).then(fullSnippets => {
       setSelectedSnippets(fullSnippets)
     })
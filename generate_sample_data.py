@@ -3,6 +3,10 @@ Generate synthetic EEG data for testing the EEG Rater application.
 Creates 10 EDF files with varying patterns (normal and abnormal).
 """
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+
 import numpy as np
 from pathlib import Path
 
@@ -22,147 +26,197 @@ CHANNEL_NAMES = [
 SFREQ = 256  # Sampling frequency in Hz
 DURATION = 30  # Duration in seconds
 
+# Signals are generated in float32: they end up as 16-bit EDF samples, so
+# float64 only doubles memory traffic without adding usable precision
+
+
+@lru_cache(maxsize=None)
+def time_vector(n_samples, sfreq):
+    """Sample times in seconds; cached and shared, so it is read-only."""
+    t = (np.arange(n_samples) / sfreq).astype(np.float32)
+    t.setflags(write=False)
+    return t
 
-def generate_filtered_noise(n_samples, sfreq, low_freq=0.5, high_freq=70):
-    """Generate bandpass filtered noise that looks like EEG background."""
+
+def generate_filtered_noise(rng, n_channels, n_samples, sfreq, low_freq=0.5, high_freq=70, out=None):
+    """
+    Generate bandpass filtered noise that looks like EEG background, one row
+    per channel. Written into out if given.
+    """
     # Generate white noise
-    noise = np.random.randn(n_samples)
+    noise = rng.standard_normal((n_channels, n_samples), dtype=np.float32)
 
     # Apply simple smoothing to reduce sharp transients
     # This creates more natural-looking background activity
     kernel_size = max(1, int(sfreq / high_freq))
-    kernel = np.ones(kernel_size) / kernel_size
-    smoothed = np.convolve(noise, kernel, mode='same')
-
-    return smoothed * 10  # Scale to reasonable EEG amplitude
-
-
-def generate_oscillation(n_samples, sfreq, freq, amplitude, phase_noise=0.1):
-    """Generate a neural oscillation with slight frequency variation."""
-    t = np.arange(n_samples) / sfreq
-    # Add slight frequency wobble for more natural look
-    phase = 2 * np.pi * freq * t
-    # Add slow phase noise
-    phase_drift = np.cumsum(np.random.randn(n_samples) * phase_noise) / sfreq
-    return amplitude * np.sin(phase + phase_drift)
-
-
-def generate_base_eeg(n_channels, n_samples, sfreq):
-    """Generate realistic-looking base EEG signal."""
-    data = np.zeros((n_channels, n_samples))
+    # Box filter as a running mean of cumulative sums: O(n) whatever the
+    # kernel size, and zero-padded to line up with np.convolve(mode='same')
+    padded = np.pad(noise, [(0, 0), (kernel_size // 2 + 1, (kernel_size - 1) // 2)])
+    csum = np.cumsum(padded, axis=-1)
+    smoothed = np.subtract(csum[:, kernel_size:], csum[:, :-kernel_size], out=out)
+    smoothed *= 10 / kernel_size  # Scale to reasonable EEG amplitude
+
+    return smoothed
+
+
+def generate_oscillation(rng, n_samples, sfreq, freq, amplitude, phase_noise=0.1):
+    """
+    Generate a neural oscillation with slight frequency variation.
+
+    freq and amplitude may be (n_channels, 1) arrays to generate one
+    oscillation per channel in a single (n_channels, n_samples) array.
+    """
+    t = time_vector(n_samples, sfreq)
+    # Slow phase noise adds slight frequency wobble for a more natural look
+    # (scaled first, then summed in place: no temporaries beyond the draw)
+    phase = rng.standard_normal(np.broadcast(freq, t).shape, dtype=np.float32)
+    phase *= phase_noise / sfreq
+    np.cumsum(phase, axis=-1, out=phase)
+    # Add the steady phase, then take sin and scale in the same buffer
+    phase += (2 * np.pi * np.asarray(freq)).astype(np.float32) * t
+    np.sin(phase, out=phase)
+    phase *= amplitude
+    return phase
+
+
+def generate_base_eeg(rng, n_channels, n_samples, sfreq, out=None):
+    """
+    Generate realistic-looking base EEG signal.
+
+    If out is given, the signal is built in that (n_channels, n_samples)
+    float32 array instead of a new one.
+    """
+    # Background activity (filtered noise)
+    data = generate_filtered_noise(rng, n_channels, n_samples, sfreq, out=out)
+
+    # Alpha rhythm (8-13 Hz) - stronger in posterior channels
+    alpha_amp = np.where(np.arange(n_channels) >= 12, 25.0, 12.0).astype(np.float32)[:, None]
+    alpha_freq = 10 + rng.uniform(-1, 1, (n_channels, 1))
+    alpha = generate_oscillation(rng, n_samples, sfreq, alpha_freq, alpha_amp)
+
+    # Beta rhythm (13-30 Hz) - smaller amplitude
+    beta_amp = 5
+    beta_freq = 18 + rng.uniform(-2, 2, (n_channels, 1))
+    beta = generate_oscillation(rng, n_samples, sfreq, beta_freq, beta_amp)
+
+    # Theta rhythm (4-8 Hz)
+    theta_amp = 6
+    theta_freq = 6 + rng.uniform(-1, 1, (n_channels, 1))
+    theta = generate_oscillation(rng, n_samples, sfreq, theta_freq, theta_amp)
+
+    # Combine in place - scale down to realistic total amplitude
+    data *= 0.5
+    data += alpha
+    data += beta
+    data += theta
+    data *= 0.8
+
+    # Add very small high-frequency noise
+    data += rng.standard_normal((n_channels, n_samples), dtype=np.float32) * 1
 
-    for ch in range(n_channels):
-        # Background activity (filtered noise)
-        background = generate_filtered_noise(n_samples, sfreq)
-
-        # Alpha rhythm (8-13 Hz) - stronger in posterior channels
-        alpha_amp = 25 if ch >= 12 else 12
-        alpha_freq = 10 + np.random.uniform(-1, 1)
-        alpha = generate_oscillation(n_samples, sfreq, alpha_freq, alpha_amp)
+    return data
 
-        # Beta rhythm (13-30 Hz) - smaller amplitude
-        beta_amp = 5
-        beta_freq = 18 + np.random.uniform(-2, 2)
-        beta = generate_oscillation(n_samples, sfreq, beta_freq, beta_amp)
 
-        # Theta rhythm (4-8 Hz)
-        theta_amp = 6
-        theta_freq = 6 + np.random.uniform(-1, 1)
-        theta = generate_oscillation(n_samples, sfreq, theta_freq, theta_amp)
+@lru_cache(maxsize=None)
+def spike_waveform(sfreq):
+    """
+    Unit-amplitude spike (~70ms duration, sharp rise, slower fall); cached
+    and shared, so it is read-only.
+    """
+    spike_duration = int(0.07 * sfreq)  # ~18 samples
 
-        # Combine - scale down to realistic total amplitude
-        data[ch] = (background * 0.5 + alpha + beta + theta) * 0.8
+    # Spike shape: fast rise, slower fall with small afterwave
+    spike_wave = np.zeros(spike_duration, dtype=np.float32)
+    rise_end = int(spike_duration * 0.25)
+    fall_end = int(spike_duration * 0.7)
 
-        # Add very small high-frequency noise
-        data[ch] += np.random.randn(n_samples) * 1
+    spike_wave[:rise_end] = np.sin(np.linspace(0, np.pi/2, rise_end))
+    spike_wave[rise_end:fall_end] = np.cos(np.linspace(0, np.pi/2, fall_end - rise_end))
+    spike_wave[fall_end:] = -0.2 * np.sin(np.linspace(0, np.pi, spike_duration - fall_end))
 
-    return data
+    spike_wave.setflags(write=False)
+    return spike_wave
 
 
-def add_spikes(data, sfreq, n_spikes=5, spike_amplitude=80):
+def add_spikes(rng, data, sfreq, n_spikes=5, spike_amplitude=80):
     """Add epileptiform spikes - sharp but physiologically plausible."""
     n_channels, n_samples = data.shape
 
-    for _ in range(n_spikes):
-        spike_time = np.random.randint(int(0.1 * n_samples), int(0.9 * n_samples))
-        affected_channels = np.random.choice(n_channels, size=np.random.randint(3, 8), replace=False)
-
-        # Create spike waveform (~70ms duration, sharp rise, slower fall)
-        spike_duration = int(0.07 * sfreq)  # ~18 samples
-        t_spike = np.linspace(0, 1, spike_duration)
+    spike_wave = spike_waveform(sfreq) * np.float32(spike_amplitude)
+    spike_duration = len(spike_wave)
 
-        # Spike shape: fast rise, slower fall with small afterwave
-        spike_wave = np.zeros(spike_duration)
-        rise_end = int(spike_duration * 0.25)
-        fall_end = int(spike_duration * 0.7)
+    # Channel indices shuffled in place for each spike; the first few are
+    # a sample without replacement, with no per-spike permutation array
+    channels = np.arange(n_channels)
 
-        spike_wave[:rise_end] = np.sin(np.linspace(0, np.pi/2, rise_end))
-        spike_wave[rise_end:fall_end] = np.cos(np.linspace(0, np.pi/2, fall_end - rise_end))
-        spike_wave[fall_end:] = -0.2 * np.sin(np.linspace(0, np.pi, spike_duration - fall_end))
-
-        spike_wave *= spike_amplitude
+    for _ in range(n_spikes):
+        spike_time = rng.integers(int(0.1 * n_samples), int(0.9 * n_samples))
+        rng.shuffle(channels)
+        affected_channels = channels[:rng.integers(3, 8)]
 
-        for ch in affected_channels:
-            if spike_time + spike_duration < n_samples:
-                amplitude_var = 0.7 + 0.6 * np.random.random()
-                data[ch, spike_time:spike_time + spike_duration] += spike_wave * amplitude_var
+        if spike_time + spike_duration < n_samples:
+            # One amplitude per affected channel, added to all of them at once
+            amplitude_var = rng.uniform(0.7, 1.3, (len(affected_channels), 1)).astype(np.float32)
+            data[affected_channels, spike_time:spike_time + spike_duration] += spike_wave * amplitude_var
 
     return data
 
 
-def add_slowing(data, sfreq, intensity=1.0):
+def add_slowing(rng, data, sfreq, intensity=1.0):
     """Add diffuse slowing (increased delta/theta)."""
     n_channels, n_samples = data.shape
 
-    for ch in range(n_channels):
-        # Delta activity (1-4 Hz)
-        delta_freq = 2.5 + np.random.uniform(-0.5, 0.5)
-        delta = generate_oscillation(n_samples, sfreq, delta_freq, 30 * intensity)
+    # Delta activity (1-4 Hz), one frequency per channel
+    delta_freq = 2.5 + rng.uniform(-0.5, 0.5, (n_channels, 1))
+    data += generate_oscillation(rng, n_samples, sfreq, delta_freq, 30 * intensity)
 
-        # Extra theta
-        theta_freq = 5 + np.random.uniform(-0.5, 0.5)
-        theta = generate_oscillation(n_samples, sfreq, theta_freq, 20 * intensity)
-
-        data[ch] += delta + theta
+    # Extra theta
+    theta_freq = 5 + rng.uniform(-0.5, 0.5, (n_channels, 1))
+    data += generate_oscillation(rng, n_samples, sfreq, theta_freq, 20 * intensity)
 
     return data
 
 
-def add_burst_suppression(data, sfreq):
+def add_burst_suppression(rng, data, sfreq):
     """Add burst-suppression pattern."""
     n_channels, n_samples = data.shape
 
     # Create burst/suppression envelope
-    envelope = np.zeros(n_samples)
-    n_bursts = np.random.randint(4, 8)
+    envelope = np.zeros(n_samples, dtype=np.float32)
+    n_bursts = rng.integers(4, 8)
 
+    t = np.arange(n_samples)
     for _ in range(n_bursts):
-        burst_center = np.random.randint(int(0.1 * n_samples), int(0.9 * n_samples))
-        burst_width = int(np.random.uniform(0.3, 0.8) * sfreq)
+        burst_center = rng.integers(int(0.1 * n_samples), int(0.9 * n_samples))
+        burst_width = int(rng.uniform(0.3, 0.8) * sfreq)
 
-        # Gaussian-shaped burst envelope
-        t = np.arange(n_samples)
-        burst = np.exp(-0.5 * ((t - burst_center) / (burst_width / 3)) ** 2)
-        envelope = np.maximum(envelope, burst)
+        # Gaussian-shaped burst envelope, only evaluated within 6 sigma of
+        # the center (beyond that it is below 1e-7 and can't change the max)
+        sigma = burst_width / 3
+        lo = max(0, int(burst_center - 6 * sigma))
+        hi = min(n_samples, int(burst_center + 6 * sigma) + 1)
+        burst = np.exp(-0.5 * ((t[lo:hi] - burst_center) / sigma) ** 2)
+        np.maximum(envelope[lo:hi], burst, out=envelope[lo:hi])
 
     # Apply envelope: suppress between bursts
     suppression_level = 0.05
-    for ch in range(n_channels):
-        data[ch] = data[ch] * (suppression_level + (1 - suppression_level) * envelope)
+    factor = suppression_level + (1 - suppression_level) * envelope
+    np.multiply(data, factor, out=data)
 
     return data
 
 
-def add_rhythmic_discharge(data, sfreq, freq=3.0):
+def add_rhythmic_discharge(rng, data, sfreq, freq=3.0):
     """Add rhythmic epileptiform discharge."""
     n_channels, n_samples = data.shape
 
-    rhythm = generate_oscillation(n_samples, sfreq, freq, 50)
+    rhythm = generate_oscillation(rng, n_samples, sfreq, freq, 50)
     # Add harmonic
-    rhythm += generate_oscillation(n_samples, sfreq, freq * 2, 20)
+    rhythm += generate_oscillation(rng, n_samples, sfreq, freq * 2, 20)
 
-    for ch in range(n_channels):
-        data[ch] += rhythm * (0.8 + 0.4 * np.random.random())
+    # Same rhythm on every channel, with a per-channel gain
+    gain = rng.uniform(0.8, 1.2, (n_channels, 1)).astype(np.float32)
+    data += rhythm * gain
 
     return data
 
@@ -194,86 +248,119 @@ def write_edf(filename, data, channel_names, sfreq):
     digital_min = -32768
     digital_max = 32767
 
-    scale = (physical_max - physical_min) / (digital_max - digital_min)
-    data_clipped = np.clip(data, physical_min, physical_max)
-    data_digital = ((data_clipped - physical_min) / scale + digital_min).astype(np.int16)
+    # Quantize in the clipped copy: the only other allocation is the int16 result
+    inv_scale = (digital_max - digital_min) / (physical_max - physical_min)
+    data_digital = np.clip(data, physical_min, physical_max)
+    data_digital -= physical_min
+    data_digital *= inv_scale
+    data_digital += digital_min
+    # Round to the nearest step rather than truncating; float32 error could
+    # otherwise push values just below an integer and down a whole step
+    np.rint(data_digital, out=data_digital)
+    data_digital = data_digital.astype(np.int16)
+
+    def field(value, width):
+        return str(value).ljust(width).encode('ascii')
+
+    # Build the whole header in memory; per-channel fields that are the same
+    # for every channel are formatted once and repeated
+    header_size = 256 + n_channels * 256
+    header = [
+        b'0       ',
+        field('X X X X', 80),
+        field('Startdate 01-JAN-2024 X X X', 80),
+        b'01.01.24',
+        b'00.00.00',
+        field(header_size, 8),
+        field('EDF+C', 44),
+        field(n_records, 8),
+        field(record_duration, 8),
+        field(n_channels, 4),
+    ]
+    header += [field(name, 16) for name in channel_names]
+    header += [
+        field('AgAgCl electrode', 80) * n_channels,
+        field('uV', 8) * n_channels,
+        field(physical_min, 8) * n_channels,
+        field(physical_max, 8) * n_channels,
+        field(digital_min, 8) * n_channels,
+        field(digital_max, 8) * n_channels,
+        field('HP:0.5Hz LP:70Hz', 80) * n_channels,
+        field(samples_per_record, 8) * n_channels,
+        field('', 32) * n_channels,
+    ]
 
     with open(filename, 'wb') as f:
-        f.write(b'0       ')
-        f.write('X X X X'.ljust(80).encode('ascii'))
-        f.write('Startdate 01-JAN-2024 X X X'.ljust(80).encode('ascii'))
-        f.write(b'01.01.24')
-        f.write(b'00.00.00')
-        header_size = 256 + n_channels * 256
-        f.write(str(header_size).ljust(8).encode('ascii'))
-        f.write(b'EDF+C'.ljust(44))
-        f.write(str(n_records).ljust(8).encode('ascii'))
-        f.write(str(record_duration).ljust(8).encode('ascii'))
-        f.write(str(n_channels).ljust(4).encode('ascii'))
-
-        for name in channel_names:
-            f.write(name.ljust(16).encode('ascii'))
-        for _ in range(n_channels):
-            f.write('AgAgCl electrode'.ljust(80).encode('ascii'))
-        for _ in range(n_channels):
-            f.write('uV'.ljust(8).encode('ascii'))
-        for _ in range(n_channels):
-            f.write(str(physical_min).ljust(8).encode('ascii'))
-        for _ in range(n_channels):
-            f.write(str(physical_max).ljust(8).encode('ascii'))
-        for _ in range(n_channels):
-            f.write(str(digital_min).ljust(8).encode('ascii'))
-        for _ in range(n_channels):
-            f.write(str(digital_max).ljust(8).encode('ascii'))
-        for _ in range(n_channels):
-            f.write('HP:0.5Hz LP:70Hz'.ljust(80).encode('ascii'))
-        for _ in range(n_channels):
-            f.write(str(samples_per_record).ljust(8).encode('ascii'))
-        for _ in range(n_channels):
-            f.write(' '.ljust(32).encode('ascii'))
-
-        for rec in range(n_records):
-            start = rec * samples_per_record
-            end = start + samples_per_record
-            for ch in range(n_channels):
-                f.write(data_digital[ch, start:end].tobytes())
+        f.write(b''.join(header))
+
+        # EDF stores each record as every channel's samples in turn, which is
+        # (channel, record, sample) transposed to (record, channel, sample)
+        records = data_digital.reshape(n_channels, n_records, samples_per_record)
+        f.write(records.transpose(1, 0, 2).tobytes())
 
     print(f"Created: {filename}")
 
 
-def main():
-    np.random.seed(42)
-    n_samples = DURATION * SFREQ
-    n_channels = len(CHANNEL_NAMES)
-
-    patterns = [
+def get_patterns(rng):
+    """(filename, description, modifier) for each sample file; modifiers draw from rng."""
+    return [
         ("sample_01_normal", "Normal EEG", None),
         ("sample_02_normal_variant", "Normal variant", None),
-        ("sample_03_mild_slowing", "Mild slowing", lambda d: add_slowing(d, SFREQ, 0.4)),
-        ("sample_04_moderate_slowing", "Moderate slowing", lambda d: add_slowing(d, SFREQ, 0.8)),
-        ("sample_05_focal_spikes", "Focal spikes", lambda d: add_spikes(d, SFREQ, n_spikes=6, spike_amplitude=70)),
-        ("sample_06_frequent_spikes", "Frequent spikes", lambda d: add_spikes(d, SFREQ, n_spikes=12, spike_amplitude=90)),
-        ("sample_07_rhythmic_delta", "Rhythmic delta", lambda d: add_rhythmic_discharge(d, SFREQ, freq=2.5)),
+        ("sample_03_mild_slowing", "Mild slowing", lambda d: add_slowing(rng, d, SFREQ, 0.4)),
+        ("sample_04_moderate_slowing", "Moderate slowing", lambda d: add_slowing(rng, d, SFREQ, 0.8)),
+        ("sample_05_focal_spikes", "Focal spikes", lambda d: add_spikes(rng, d, SFREQ, n_spikes=6, spike_amplitude=70)),
+        ("sample_06_frequent_spikes", "Frequent spikes", lambda d: add_spikes(rng, d, SFREQ, n_spikes=12, spike_amplitude=90)),
+        ("sample_07_rhythmic_delta", "Rhythmic delta", lambda d: add_rhythmic_discharge(rng, d, SFREQ, freq=2.5)),
         ("sample_08_asymmetry", "Asymmetry", lambda d: add_asymmetry(d, SFREQ)),
-        ("sample_09_burst_suppression", "Burst suppression", lambda d: add_burst_suppression(d, SFREQ)),
-        ("sample_10_mixed_abnormal", "Mixed abnormalities", lambda d: add_spikes(add_slowing(d, SFREQ, 0.5), SFREQ, n_spikes=4)),
+        ("sample_09_burst_suppression", "Burst suppression", lambda d: add_burst_suppression(rng, d, SFREQ)),
+        ("sample_10_mixed_abnormal", "Mixed abnormalities", lambda d: add_spikes(rng, add_slowing(rng, d, SFREQ, 0.5), SFREQ, n_spikes=4)),
     ]
 
-    print(f"Generating {len(patterns)} synthetic EEG files...")
+
+@lru_cache(maxsize=None)
+def signal_buffer(n_channels, n_samples):
+    """
+    Scratch array reused for every file a process generates; modifiers work
+    in place and write_edf is done with it before the next file starts.
+    """
+    return np.empty((n_channels, n_samples), dtype=np.float32)
+
+
+def build_and_write(index, seed, output_dir):
+    """Generate sample file number index with its own seeded RNG and write it."""
+    rng = np.random.default_rng(seed)
+    filename, description, modifier = get_patterns(rng)[index]
+    n_samples = DURATION * SFREQ
+    n_channels = len(CHANNEL_NAMES)
+
+    data = generate_base_eeg(rng, n_channels, n_samples, SFREQ, out=signal_buffer(n_channels, n_samples))
+    if modifier is not None:
+        data = modifier(data)
+
+    filepath = output_dir / f"{filename}.edf"
+    write_edf(filepath, data, CHANNEL_NAMES, SFREQ)
+    return description
+
+
+def main():
+    n_patterns = len(get_patterns(None))
+
+    print(f"Generating {n_patterns} synthetic EEG files...")
     print(f"Output directory: {OUTPUT_DIR}")
     print("-" * 60)
 
-    for filename, description, modifier in patterns:
-        data = generate_base_eeg(n_channels, n_samples, SFREQ)
-        if modifier is not None:
-            data = modifier(data)
-
-        filepath = OUTPUT_DIR / f"{filename}.edf"
-        write_edf(filepath, data, CHANNEL_NAMES, SFREQ)
-        print(f"  Pattern: {description}")
+    # Files are independent, so build them in parallel; each one gets its
+    # own seed so the output doesn't depend on scheduling
+    indices = range(n_patterns)
+    seeds = [42 + i for i in indices]
+    max_workers = min(n_patterns, os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        descriptions = executor.map(build_and_write, indices, seeds, repeat(OUTPUT_DIR))
+        for description in descriptions:
+            print(f"  Pattern: {description}")
 
     print("-" * 60)
-    print(f"Done! {len(patterns)} files, {len(patterns) * (DURATION // 10)} snippets total")
+    print(f"Done! {n_patterns} files, {n_patterns * (DURATION // 10)} snippets total")
 
 
 if __name__ == "__main__":